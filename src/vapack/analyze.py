@@ -1,14 +1,10 @@
 import itertools as it
-from copy import deepcopy
 
 import numpy as np
 import numpy.typing as npt
-import plotly.express as px
-import plotly.figure_factory as ff
-import plotly.graph_objects as go
 
 import vapack.extensions as vext
-from vapack.types import Ions, Poscar
+from vapack.types import Poscar
 
 
 def coordination_number(
@@ -17,19 +13,16 @@ def coordination_number(
     max_bondlength: float,
     species_filter: list[str] | None = None,
 ) -> int | npt.NDArray:
-    poscar = deepcopy(poscar)
-    poscar._convert_to_cartesian()
-    species_filter = (
-        list(poscar.species.keys()) if species_filter is None else species_filter
-    )
     if not isinstance(index, (list,)):
         index = [index]
-    coordinations = np.zeros(len(index), dtype=np.int64)
-    for i, ion_i in enumerate(index):
-        neighbors = vext.get_neighbors(poscar, ion_i, max_bondlength, "c", True)
-        coordinations[i] = len(
-            [i for i, ion in neighbors if ion.species in species_filter]
-        )
+    neighbor_lists = vext.get_all_neighbors(poscar, index, max_bondlength)
+    if species_filter is None:
+        # Every species counts, so only the number of neighbors matters
+        counts = [len(neighbors) for neighbors in neighbor_lists]
+    else:
+        in_filter = np.isin(poscar.get_species(), list(species_filter))
+        counts = [in_filter[neighbors].sum() for neighbors in neighbor_lists]
+    coordinations = np.array(counts, dtype=np.int64)
     if len(coordinations) == 1:
         coordinations = coordinations[0]
     return coordinations
@@ -41,7 +34,7 @@ def all_species_coordination_number(
     max_bondlength: float,
     species_filter: list[str] | None = None,
 ) -> int | npt.NDArray:
-    ion_indices = [i for i, ion in poscar.ions if ion.species == species]
+    ion_indices = np.flatnonzero(poscar.get_species() == species).tolist()
     return coordination_number(poscar, ion_indices, max_bondlength, species_filter)
 
 
@@ -52,49 +45,40 @@ def bond_angle(
     Given any three atoms/ions, return the angle formed between them.
     Assume the second given atom/ion, center_ion, is the angle point.
     """
-    # Convert the poscar to cartesian since bond angle
+    frac = poscar.get_direct_positions()
+    return _triplet_angles(frac, poscar.lattice, [indices], degrees)[0]
+
+
+def _triplet_angles(
+    frac: npt.NDArray, lattice: npt.NDArray, idx: npt.ArrayLike, degrees: bool = False
+) -> npt.NDArray:
+    """
+    Return the angle at the center of every (a, center, b) row of idx, given
+    direct positions and the lattice. Bond vectors go to the nearest periodic
+    image of each end.
+    """
+    idx = np.asarray(idx, dtype=int).reshape((-1, 3))
+    # Wrap in direct coordinates, then go cartesian since bond angle
     # makes little sense in direct coordinates
-    poscar = deepcopy(poscar)
-    poscar._convert_to_cartesian()
-    # Center the poscar around the central ion/atom
-    ion_center = poscar.ions[indices[1]]
-    poscar = vext.get_centered_around(poscar, ion_center.position, poscar.mode)  # type: ignore
-    # Create some better names
-    ion_a = poscar.ions[indices[0]]
-    ion_b = poscar.ions[indices[2]]
-    # Unit vector from center to a
-    ra = ion_a.position - ion_center.position
-    ra = ra / np.sqrt((ra**2).sum())
-    # Unit vector from center to b
-    rb = ion_b.position - ion_center.position
-    rb = rb / np.sqrt((rb**2).sum())
-    # Basic trig to get the (acute) angle
-    cross = np.cross(ra, rb)
-    mag = np.sqrt((cross**2).sum())
-    theta = np.arcsin(mag)
-    # Use vector projection to recover obtuse vs acute angle info
-    dot = np.dot(ra, rb)
-    # Do nothing if the angle is acute
-    if dot >= 0:
-        pass
-    # Or set it to the difference from pi to the (wrong) theta if obtuse
-    else:
-        theta = np.pi - theta
-    # Convert to degrees if requested
+    ra, ra2 = vext._min_image_cartesian(frac[idx[:, 0]] - frac[idx[:, 1]], lattice)
+    rb, rb2 = vext._min_image_cartesian(frac[idx[:, 2]] - frac[idx[:, 1]], lattice)
+    # |a x b|^2 = |a|^2 |b|^2 - (a . b)^2 avoids building the cross products, and
+    # arctan2 needs neither normalizing nor branching on acute vs obtuse
+    dots = np.einsum("ij,ij->i", ra, rb)
+    cross2 = ra2 * rb2 - dots**2
+    angles = np.arctan2(np.sqrt(np.maximum(cross2, 0.0)), dots)
     if degrees:
-        theta *= 180 / np.pi
-    # and return
-    return theta
+        np.degrees(angles, out=angles)
+    return angles
 
 
-def all_bond_angles(
-    poscar: Poscar,
-    chain: tuple[str, str, str] | str,
-    max_bondlength: int,
-    degrees: bool = False,
-) -> npt.NDArray:
-    poscar = deepcopy(poscar)
-    # Interpret the chain argument
+def _parse_chain(
+    poscar: Poscar, chain: tuple[str, str, str] | str
+) -> tuple[str, str, str]:
+    """
+    Interpret a bond angle chain as (end a, center, end b) and make sure
+    its species actually exist in the poscar.
+    """
     if isinstance(chain, (tuple, list)):
         species_a = chain[0].strip()
         species_b = chain[2].strip()
@@ -106,41 +90,89 @@ def all_bond_angles(
         species_a = cl[0].strip()
         species_b = cl[2].strip()
         species_center = cl[1].strip()
-    # Make sure the chain's species actually exist in the poscar
     for sp in (species_a, species_b, species_center):
-        if sp not in list(poscar.species.keys()):
+        if sp not in poscar.species:
             raise RuntimeError(
                 f'Could not find species {sp} in provided poscar "{poscar.comment}"'
             )
-    # Create a list of all chains that can be found within the poscar by doing a radial neighbor search
-    # around the central atom/ion
-    triplet_list = []
-    # TODO: Fix this! An empty declaration populates with data???
-    center_ions = Ions([], [])
-    for i, ion in poscar.ions:
-        if ion.species == species_center:
-            center_ions.append(ion, i)
-    for i, ion_c in center_ions:
-        neighbors = vext.get_neighbors(
-            poscar, i, max_bondlength, mode="c", periodic=True
+    return species_a, species_center, species_b
+
+
+def all_bond_angles(
+    poscar: Poscar,
+    chain: tuple[str, str, str] | str,
+    max_bondlength: int,
+    degrees: bool = False,
+) -> npt.NDArray:
+    return all_bond_angles_multi(poscar, [chain], [max_bondlength], degrees)[0]
+
+
+def all_bond_angles_multi(
+    poscar: Poscar,
+    chains: list[tuple[str, str, str]] | list[str],
+    max_bondlengths: list[float],
+    degrees: bool = False,
+) -> list[npt.NDArray]:
+    """
+    Return the bond angles of every chain, running one neighbor search per
+    center species at the largest bondlength any of its chains needs.
+    """
+    if len(chains) != len(max_bondlengths):
+        raise RuntimeError("max_bondlength list and chain list are not same size!")
+    parsed = [_parse_chain(poscar, c) for c in chains]
+    species = poscar.get_species()
+    frac = poscar.get_direct_positions()
+    # Search each center species once, as far out as its chains reach
+    search_radius: dict[str, float] = {}
+    for (_, species_center, _), r in zip(parsed, max_bondlengths):
+        search_radius[species_center] = max(r, search_radius.get(species_center, r))
+    searches = {}
+    for species_center, r in search_radius.items():
+        center_indices = np.flatnonzero(species == species_center)
+        neighbor_lists = vext.get_all_neighbors(poscar, center_indices, r)
+        # Centers with fewer than two neighbors can never anchor a chain
+        counts = np.array([len(n) for n in neighbor_lists], dtype=int)
+        active = np.flatnonzero(counts >= 2)
+        searches[species_center] = (
+            center_indices[active],
+            [neighbor_lists[k] for k in active],
         )
-        # If not enough neighbors were discovered, then skip this one
-        if len(neighbors) < 2:
-            continue
-        # Wretched complex and c-style loop
-        for j, (jj, ion_a) in enumerate(neighbors):  # type: ignore
-            if j == len(neighbors):
-                break
-            for k, (kk, ion_b) in enumerate(neighbors):  # type: ignore
-                if k <= j:
-                    continue
-                if ion_a.species != species_a or ion_b.species != species_b:
+
+    all_angles = []
+    for (species_a, species_center, species_b), radius in zip(parsed, max_bondlengths):
+        # Create a list of all chains that can be found within the poscar from the
+        # neighbors around each central atom/ion
+        triplets: list[npt.NDArray] = [np.empty((0, 3), dtype=int)]
+        center_indices, neighbor_lists = searches[species_center]
+        for i, neighbors in zip(center_indices.tolist(), neighbor_lists):
+            # Trim neighbors found for a longer chain down to this one's bondlength
+            if radius < search_radius[species_center]:
+                _, r2 = vext._min_image_cartesian(
+                    frac[neighbors] - frac[i], poscar.lattice
+                )
+                neighbors = neighbors[r2 <= radius * radius]
+                # If trimming left too few neighbors, then skip this one
+                if len(neighbors) < 2:
                     continue
-                triplet_list.append(Ions([ion_a, ion_c, ion_b], [jj, i, kk]))
-    bond_angles = np.zeros(len(triplet_list), dtype=float)
-    for i, triplet in enumerate(triplet_list):
-        bond_angles[i] = bond_angle(poscar, triplet.indices, degrees)
-    return bond_angles
+            # Split the neighbors by species once instead of checking every pair
+            neighbors_a = neighbors[species[neighbors] == species_a]
+            neighbors_b = neighbors[species[neighbors] == species_b]
+            # Count each pair once for like ends, every a-b pairing otherwise
+            if species_a == species_b:
+                j, k = np.triu_indices(len(neighbors_a), k=1)
+                ends_a, ends_b = neighbors_a[j], neighbors_a[k]
+            else:
+                ends_a, ends_b = np.meshgrid(neighbors_a, neighbors_b, indexing="ij")
+            triplets.append(
+                np.column_stack(
+                    (ends_a.ravel(), np.full(ends_a.size, i), ends_b.ravel())
+                )
+            )
+        # Compute every angle at once from the gathered triplet positions
+        idx = np.concatenate(triplets)
+        bond_angles = _triplet_angles(frac, poscar.lattice, idx, degrees)
+        all_angles.append(bond_angles)
+    return all_angles
 
 
 def bond_angle_histogram_plotly(
@@ -150,6 +182,11 @@ def bond_angle_histogram_plotly(
     bin_width: float | list[float] = 0.0872664626,
     degrees: bool = False,
 ):
+    # Plotly is slow to import and only needed here
+    import plotly.express as px
+    import plotly.figure_factory as ff
+    import plotly.graph_objects as go
+
     # Set up graph x-axis information
     (amin, amax) = (0, 180) if degrees else (0, np.pi)
     if bin_width == 0.0872664626 and degrees:
@@ -186,9 +223,9 @@ def bond_angle_histogram_plotly(
     colors = [c for c, _ in zip(color_cycle, range(len(chain)))]
     fig = go.Figure()
 
-    angles = [
-        all_bond_angles(poscar, c, m, degrees) for c, m in zip(chain, max_bondlength)
-    ]
+    angles = all_bond_angles_multi(
+        poscar, chain, [m for _, m in zip(chain, max_bondlength)], degrees
+    )
     labels = ["-".join(s) if "-" not in s else s for s in chain]
 
     fig = ff.create_distplot(
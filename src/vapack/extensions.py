@@ -3,7 +3,7 @@ from copy import deepcopy
 import numpy as np
 import numpy.typing as npt
 
-from vapack.types import Ion, Ions, Poscar  # type: ignore
+from vapack.types import Ions, Poscar, _is_cartesian, _lattice_inverse  # type: ignore
 
 
 def translate(ions: Ions, r: npt.NDArray[np.float64]) -> Ions:
@@ -11,12 +11,161 @@ def translate(ions: Ions, r: npt.NDArray[np.float64]) -> Ions:
     Translate the given selection along the x, y, or z dimension.
     """
     ions_t = deepcopy(ions)
-    r = np.array(r)
-    for i, _ in enumerate(ions_t):
-        ions_t[i].position += r
+    ions_t.set_positions(ions_t.get_positions() + np.asarray(r, dtype=float))
     return ions_t
 
 
+def convert_cartesian_batch(
+    positions: npt.NDArray[np.float64],
+    lattices: npt.NDArray[np.float64],
+    tol: float = 1e-8,
+) -> npt.NDArray[np.float64]:
+    """
+    Convert a batch of direct positions (B, N, 3) to cartesian, given the matching
+    lattices (B, 3, 3), in a single broadcast matrix product. Each frame matches
+    what Poscar._convert_to_cartesian gives, e.g. for a trajectory of poscars:
+
+        lattices = np.stack([p.lattice for p in frames])
+        positions = np.stack([p.get_direct_positions() for p in frames])
+        cartesian = convert_cartesian_batch(positions, lattices)
+    """
+    r = np.matmul(positions, lattices)
+    r[np.abs(r) <= tol] = 0.0
+    return r
+
+
+def convert_direct_batch(
+    positions: npt.NDArray[np.float64],
+    lattices: npt.NDArray[np.float64],
+    tol: float = 1e-8,
+) -> npt.NDArray[np.float64]:
+    """
+    Convert a batch of cartesian positions (B, N, 3) to direct, given the matching
+    lattices (B, 3, 3), in a single broadcast matrix product. Uses the same closed
+    form inverse as Poscar.lattice_inv, so each frame matches what
+    Poscar._convert_to_direct gives.
+    """
+    r = np.matmul(positions, _lattice_inverse(np.asarray(lattices, dtype=float)))
+    r[np.abs(r) <= tol] = 0.0
+    return r
+
+
+def _min_image_cartesian(
+    frac_diff: npt.NDArray[np.float64],
+    lattice: npt.NDArray[np.float64],
+    periodic: bool = True,
+) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+    """
+    Return the cartesian vectors (..., 3) and their squared lengths (...) for the
+    given direct displacements, taken to the nearest periodic image if periodic.
+    """
+    if periodic:
+        frac_diff = frac_diff - np.rint(frac_diff)
+    r = frac_diff @ lattice
+    return r, np.einsum("...i,...i->...", r, r)
+
+
+def get_all_neighbors(
+    poscar: Poscar,
+    indices: list[int] | npt.NDArray[np.int64],
+    radius: float,
+    periodic: bool = True,
+) -> list[npt.NDArray[np.int64]]:
+    """
+    Return the indices of all ions within a cartesian radius of each of the given ions.
+    Distances are computed for a block of centers at a time against every ion, using
+    the nearest periodic image of each ion if periodic.
+    """
+    indices = np.asarray(indices, dtype=int).reshape(-1)
+    frac = poscar.get_direct_positions()
+    # Keep the (centers, ions, 3) displacement block to roughly a million entries
+    block = max(1, 2**20 // max(len(frac), 1))
+    neighbors = []
+    for start in range(0, len(indices), block):
+        centers = indices[start : start + block]
+        d = frac[None, :, :] - frac[centers, None, :]
+        _, r2 = _min_image_cartesian(d, poscar.lattice, periodic)
+        within = r2 <= radius * radius
+        # An ion is not its own neighbor
+        within[np.arange(len(centers)), centers] = False
+        neighbors += [np.flatnonzero(row) for row in within]
+    return neighbors
+
+
+def _nearest_image_shifts(
+    poscar: Poscar, point: npt.NDArray[np.float64], mode: str = "Direct"
+) -> npt.NDArray[np.float64]:
+    """
+    Return the whole lattice vector shifts (in direct coordinates) that take every
+    ion to its periodic image nearest the point, without modifying the poscar.
+    """
+    # Make sure the point is a numpy array for math
+    point = np.array(point, dtype=float)
+    if np.size(point) != 3:
+        raise RuntimeError(
+            f"Centering around point {point} is ambiguous without 3 dimensions"
+        )
+    # If asked to work in a cartesian, convert the point to direct
+    if _is_cartesian(mode):
+        point = point @ poscar.lattice_inv
+
+    # The image within half a lattice vector of the point,
+    # however many cells away the ion started
+    return -np.rint(poscar.get_direct_positions() - point)
+
+
+def _shifts_in_mode(
+    poscar: Poscar, shifts: npt.NDArray[np.float64], mode: str
+) -> npt.NDArray[np.float64]:
+    """
+    Express direct lattice vector shifts in the given mode.
+    """
+    return shifts @ poscar.lattice if _is_cartesian(mode) else shifts
+
+
+def _sphere_members(
+    poscar: Poscar,
+    center: npt.NDArray[np.float64],
+    radius: float,
+    mode: str,
+    periodic: bool,
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.float64]]:
+    """
+    Return the indices of the ions within the sphere along with the direct shifts
+    to the image of each that was measured (nearest the center if periodic).
+    """
+    positions = poscar._positions_in_mode(mode)
+    if periodic:
+        shifts = _nearest_image_shifts(poscar, center, mode)
+        positions = positions + _shifts_in_mode(poscar, shifts, mode)
+    else:
+        shifts = np.zeros_like(positions)
+    # Cull ions outside the bounding cube, then check the distance of the rest
+    diff = positions - center
+    in_box = np.flatnonzero((np.abs(diff) <= radius).all(axis=1))
+    diff = diff[in_box]
+    keep = in_box[np.einsum("ij,ij->i", diff, diff) <= radius * radius]
+    return keep, shifts[keep]
+
+
+def _copy_selection(
+    poscar: Poscar,
+    indices: npt.NDArray[np.int64],
+    shifts: npt.NDArray[np.float64],
+) -> Ions:
+    """
+    Copy the indexed ions into an Ions list, moving each by its direct lattice
+    vector shift. Positions stay in the poscar's own mode.
+    """
+    shifts = _shifts_in_mode(poscar, shifts, poscar.mode)
+    selection = Ions([], [])
+    for k, shift in zip(indices.tolist(), shifts):
+        ion = deepcopy(poscar.ions[k])
+        ion.position = ion.position + shift
+        selection.append(ion, k)
+    return selection
+
+
 def get_neighbors(
     poscar: Poscar,
     index: int,
@@ -27,38 +176,14 @@ def get_neighbors(
     """
     Return a list of all ions that lie within a sphere around the ion identified by index.
     """
-
-    poscar = deepcopy(poscar)
     mode = poscar.mode if mode is None else mode
-    converted = False
-    if mode[0].lower() != poscar.mode[0].lower():
-        converted = True
-        poscar._toggle_mode()
-
     # TODO: Type hinting with 'center'
-    center = poscar.ions[index].position
-    selection = get_select_sphere(poscar, center, radius, mode, periodic)  # type: ignore
-    # Remove the focused ion from the neighbors list
-    # This is used since the Ions object does not support "popping" by poscar index
-    # (at the time of writing)
-    for i, (_, ion) in enumerate(selection):  # type: ignore
-        if np.allclose(ion.position, center, rtol=0.01):
-            selection.pop(i)
-
-    # If the original POSCAR was converted, undo that conversion on the list
-    if converted and poscar.is_cartesian():
-        # Reverting from cartesian to direct
-        A = poscar.lattice.transpose()
-        Ainv = np.linalg.inv(A)
-        for i, (_, ion) in enumerate(selection):  # type: ignore
-            selection[i]._apply_transformation(Ainv)
-    elif converted and poscar.is_direct():
-        # Reverting from direct to cartesian
-        A = poscar.lattice.transpose()
-        for i, (_, ion) in enumerate(selection):  # type: ignore
-            selection[i]._apply_transformation(A)
-
-    return selection
+    center = poscar._positions_in_mode(mode)[index]
+    keep, shifts = _sphere_members(poscar, center, radius, mode, periodic)
+    # Remove the focused ion from the neighbors list. The lookup above already
+    # rejected out of range indices, so only negative ones need wrapping.
+    not_center = keep != index % len(poscar.ions)
+    return _copy_selection(poscar, keep[not_center], shifts[not_center])
 
 
 def get_select_sphere(
@@ -73,42 +198,10 @@ def get_select_sphere(
     If used in direct coordinates, the sphere gets distorted with the shape of the lattice.
     Make of that what you will.
     """
-    poscar = deepcopy(poscar)
-    center = np.array(center)
-
-    # Check the mode and convert if needed
+    center = np.array(center, dtype=float)
     mode = poscar.mode if mode is None else mode
-    converted = False
-    if poscar.mode[0].lower() != mode[0].lower():
-        poscar._toggle_mode()
-        converted = True
-
-    # If periodic, center the cell around the point
-    if periodic:
-        poscar = get_centered_around(poscar, center, mode)
-
-    # Iterate through each ion in the poscar and check the distance from the center
-    # Populate an Ions list with all that reside within
-    selection_temp: list[tuple[Ion, int]] = []
-    for i, ion in poscar.ions:
-        d2 = ((ion.position - center) ** 2).sum()
-        if d2 <= radius*radius:
-            selection_temp.append((ion, i))
-    selection = Ions([i[0] for i in selection_temp], [i[1] for i in selection_temp])
-
-    # If the poscar was converted, reconvert the ions positions
-    # Case of converting from cartesian to direct
-    if converted and poscar.mode == "Cartesian":
-        A = poscar.lattice.transpose()
-        Ainv = np.linalg.inv(A)
-        for i, _ in enumerate(selection):
-            selection[i]._apply_transformation(Ainv)
-    # Case of converting from direct to cartesian
-    elif converted and poscar.mode == "Direct":
-        A = poscar.lattice.transpose()
-        for i, _ in enumerate(selection):
-            selection[i]._apply_transformation(A)
-    return selection
+    keep, shifts = _sphere_members(poscar, center, radius, mode, periodic)
+    return _copy_selection(poscar, keep, shifts)
 
 
 def get_select_box(
@@ -119,69 +212,29 @@ def get_select_box(
     mode: str | None = None,
 ) -> Ions:
     # If mode was not set, grab it automatically
-    poscar_cp = deepcopy(poscar)
-    mode = poscar_cp.mode if mode is None else mode
-
-    # Convert the POSCAR to the correct mode if necessary
-    converted = False
-    if poscar_cp.mode[0].lower() != mode[0].lower():
-        poscar_cp._toggle_mode()
-        converted = True
+    mode = poscar.mode if mode is None else mode
+    positions = poscar._positions_in_mode(mode)
 
     # Add ions that reside within box to selection list
-    selection, indices = [], []
-    for i, ion in poscar_cp.ions:
-        if (
-            (x_range is None or (x_range[0] <= ion.position[0] <= x_range[1]))
-            and (y_range is None or (y_range[0] <= ion.position[1] <= y_range[1]))
-            and (z_range is None or (z_range[0] <= ion.position[2] <= z_range[1]))
-        ):
-            indices.append(i)
-            selection.append(ion)
+    inside = np.ones(len(positions), dtype=bool)
+    for axis, bounds in enumerate((x_range, y_range, z_range)):
+        if bounds is not None:
+            r = positions[:, axis]
+            inside &= (bounds[0] <= r) & (r <= bounds[1])
+    indices = np.flatnonzero(inside).tolist()
 
-    # Reconvert the POSCAR if necessary
-    if converted:
-        poscar_cp._toggle_mode()
-
-    return Ions(selection, indices)
+    return Ions([deepcopy(poscar.ions[i]) for i in indices], indices)
 
 
 def get_centered_around(
     poscar: Poscar, point: npt.NDArray[np.float64], mode: str = "Direct"
 ) -> Poscar:
-    # Create a copy of the poscar
+    # Create a copy of the poscar, holding the images nearest the point
     poscar_cp = deepcopy(poscar)
-    # Convert to direct if needed. It's far easier to work in direct here.
-    converted = False
-    if poscar_cp.is_cartesian():
-        poscar_cp._convert_to_direct()
-        converted = True
-    # Make sure the point is a numpy array for math
-    if type(point) is not npt.NDArray:
-        point = np.array(point)
-    if np.size(point) != 3:
-        raise RuntimeError(
-            f"Centering around point {point} is ambiguous without 3 dimensions"
-        )
-    # If asked to work in a cartesian, convert the point to direct
-    if mode[0].lower() == "c":
-        A = poscar.lattice.transpose()
-        Ainv = np.linalg.inv(A)
-        point = Ainv @ point
-
-    # Make sure everything is "inside" the cell
-    poscar_cp._constrain()
-    # If something is more than 0.5*lattice vector away,
-    # either add or subtract to retrieve the appropriate image
-    for i, ion in poscar_cp.ions:
-        c = ion.position - point
-        c = -1 * np.array(np.abs(c) > 0.5, dtype=int) * np.sign(c)
-        poscar_cp.ions[i].position += c
-
-    # Reconvert if needed
-    if converted:
-        poscar_cp._toggle_mode()
-
+    shifts = _nearest_image_shifts(poscar, point, mode)
+    poscar_cp.set_positions(
+        poscar.get_positions() + _shifts_in_mode(poscar, shifts, poscar.mode)
+    )
     return poscar_cp
 
 
@@ -198,8 +251,13 @@ def get_select_chain(
 
     # Initial quantities
     jump_distance2 = jump_distance**2
+    frac = poscar.get_direct_positions()
     selection = Ions([poscar.ions[start_index]], [start_index])
     jumps = [0]
+    # Track which ions may still join the chain
+    available = ~np.isin(np.char.lower(poscar.get_species()), species_blacklist)
+    available[index_blacklist] = False
+    available[start_index] = False
 
     # TODO: For some reason Pyright is being stupid and thinks
     # the Ions iterator is an iterator in Ion. Am  I accidentally tricking
@@ -216,25 +274,15 @@ def get_select_chain(
             and selected_ion.species == "H"
         ):
             continue
-        poscar_cp = get_centered_around(poscar, selected_ion.position)
-        poscar_cp._convert_to_cartesian()
-        for j, ion in poscar_cp.ions:
-            if j in selection.indices:
-                continue
-            if ion.species.lower() in species_blacklist:
-                continue
-            if j in index_blacklist:
-                continue
-            if (
-                (poscar_cp.ions[i].position - poscar_cp.ions[j].position) ** 2
-            ).sum() > jump_distance2:
-                continue
-
-            # Append a copy of the original ion
-            selection.append(poscar.ions[j])
-            selection.indices.append(j)
+        # Distance to the nearest image of every ion not yet in the chain
+        _, r2 = _min_image_cartesian(frac - frac[i], poscar.lattice)
+        reached = available & (r2 <= jump_distance2)
+        for j in np.flatnonzero(reached).tolist():
+            # Append the original ion
+            selection.append(poscar.ions[j], j)
             # Record how many jumps it took to get here
             jumps.append(jump + 1)
+        available &= ~reached
 
         if first_hydrogen:
             first_hydrogen = False
@@ -1,14 +1,44 @@
+import io
 import itertools as it
 import re
+import shutil
 from ast import literal_eval
 from copy import deepcopy
+from functools import lru_cache
 from pathlib import Path
-from typing import SupportsIndex
+from typing import SupportsIndex, TextIO
 
 import numpy as np
 from numpy.typing import NDArray
 import vapack.rec_pseudopotentials as rec_pseudopotentials
 
+# Ion position lines as written to a POSCAR, with and without selective dynamics
+_ION_LINE = "{:>11.8f}  {:>11.8f}  {:>11.8f}\n"
+_ION_SD_LINE = "{:>11.8f}  {:>11.8f}  {:>11.8f} {:>1s} {:>1s} {:>1s}\n"
+# INCAR tag line: key, value up to the first comment character, inline comment
+_INCAR_TAG = re.compile(r"([^=]*)=([^!#]*)(?:[!#](.*))?")
+
+
+def _is_cartesian(mode: str) -> bool:
+    """
+    Return true if the mode string names cartesian coordinates (C or K, any case).
+    """
+    return mode[0].lower() in ("c", "k")
+
+
+def _lattice_inverse(lattice: NDArray) -> NDArray:
+    """
+    Closed form inverse of a lattice (3, 3) or a stack of lattices (..., 3, 3).
+    The columns of each inverse are its reciprocal vectors.
+    """
+    a, b, c = lattice[..., 0, :], lattice[..., 1, :], lattice[..., 2, :]
+    bc = np.cross(b, c)
+    det = np.einsum("...i,...i->...", a, bc)
+    if (det == 0).any():
+        raise RuntimeError("Lattice vectors are not linearly independent!")
+    inverse = np.stack([bc, np.cross(c, a), np.cross(a, b)], axis=-1)
+    return inverse / det[..., None, None]
+
 
 # Storage of position mode (direct or cartesian) is _only_ done in the POSCAR.
 # The units on position of an ion makes no sense unless taken into context with
@@ -20,6 +50,8 @@ class Ion(object):
     the ion itself. It has limited context of its container.
     """
 
+    __slots__ = ("position", "species", "selective_dynamics", "velocity")
+
     # Note: Index is not included here since it strictly applies
     # to the relative placement of the entry in the POSCAR file.
     # Indices are maintained where ion lists are relevant.
@@ -39,6 +71,18 @@ class Ion(object):
         self.velocity = velocity
         self._reinforce_types()
 
+    def __deepcopy__(self, memo: dict):
+        """
+        Copy the ion's arrays directly instead of through the generic deepcopy.
+        """
+        result = self.__class__.__new__(self.__class__)
+        memo[id(self)] = result
+        result.position = np.array(self.position)
+        result.species = self.species
+        result.selective_dynamics = np.array(self.selective_dynamics)
+        result.velocity = np.array(self.velocity)
+        return result
+
     def _reinforce_types(self):
         """
         Check the types and ensure they are consistent with expectations.
@@ -54,7 +98,7 @@ class Ion(object):
         """
         A = transform.reshape(3, 3)
         r = A @ self.position
-        r = r * np.array(np.abs(r) > tol, dtype=int)
+        r[np.abs(r) <= tol] = 0.0
         self.position = r
 
     @staticmethod
@@ -65,16 +109,11 @@ class Ion(object):
         """
         if len(sd_tags) != 3:
             raise RuntimeError("Bad selective dynamics length on ion!")
-        converted_list = []
-        for i in sd_tags:
-            match i:
-                case "T":
-                    converted_list.append(True)
-                case "F":
-                    converted_list.append(False)
-                case _:
-                    RuntimeError("Bad selective dynamics character on ion!")
-        return np.array(converted_list, dtype=bool)
+        tags = np.asarray(sd_tags, dtype=str)
+        is_true = tags == "T"
+        if not (is_true | (tags == "F")).all():
+            raise RuntimeError("Bad selective dynamics character on ion!")
+        return is_true
 
 
 # For use in POSCAR type hinting and ion portability
@@ -123,6 +162,24 @@ class Ions(list[Ion]):
         self.indices.pop(index)
         return super().pop(index)
 
+    def get_positions(self) -> NDArray:
+        """
+        Return the positions of the contained ions as an (N, 3) array.
+        """
+        return np.array([ion.position for _, ion in self], dtype=float).reshape(
+            (-1, 3)
+        )
+
+    def set_positions(self, positions: NDArray) -> None:
+        """
+        Overwrite the positions of the contained ions from an (N, 3) array.
+        """
+        positions = np.asarray(positions, dtype=float)
+        if positions.shape != (len(self), 3):
+            raise RuntimeError("Position array does not match number of ions!")
+        for (_, ion), r in zip(self, positions):
+            ion.position = r.copy()
+
 
 # Class for an INCAR since it's basically just a dictionary
 class Incar(dict):
@@ -195,21 +252,20 @@ class Incar(dict):
 
     def __section_str__(self, section: str) -> str:
         # Get the title first
-        formatted_string = f"\n# {section}\n\n"
+        lines = [f"\n# {section}\n\n"]
         # Then the solitary comments in one block
         local_solo_comments = [s[0] for s in self.solo_comments if s[1] == section]
-        for comment in local_solo_comments:
-            formatted_string += f"! {comment}\n"
-        formatted_string += "\n" if len(local_solo_comments) > 0 else ""
+        lines.extend(f"! {comment}\n" for comment in local_solo_comments)
+        if len(local_solo_comments) > 0:
+            lines.append("\n")
         # Then the keys, values, and inline comments
-        for key in self.sections[section]:
-            formatted_string += self.__tag_str__(key)
-        return formatted_string
+        lines.extend(self.__tag_str__(key) for key in self.sections[section])
+        return "".join(lines)
 
     def __tag_str__(self, key: str) -> str:
         formatted_string = f"{key:<{self.key_length}} = "
         value = self[key]
-        if type(value) is list:
+        if isinstance(value, (list, tuple)):
             value = " ".join((str(i) for i in value))
         formatted_string += f"{str(value):<{self.value_length}}"
         try:
@@ -222,27 +278,24 @@ class Incar(dict):
         return self.to_rich_string()
 
     def to_simple_string(self) -> str:
-        formatted_string = ""
+        lines = []
         for key, value in self.items():
-            if type(value) is list:
+            if isinstance(value, (list, tuple)):
                 value = " ".join((str(i) for i in value))
-            formatted_string += f"{key} = {value}\n"
-        return formatted_string.strip()
+            lines.append(f"{key} = {value}\n")
+        return "".join(lines).strip()
 
     def to_rich_string(self) -> str:
-        formatted_string = ""
         # Get any tags that aren't in a section first
         sectioned_tag_set = set(
             it.chain.from_iterable((s for s in self.sections.values()))
         )
         orphaned_tags = list(set(self.keys()) - sectioned_tag_set)
-        for key in orphaned_tags:
-            formatted_string += self.__tag_str__(key)
+        lines = [self.__tag_str__(key) for key in orphaned_tags]
         # Format for each section
-        for section in self.sections:
-            formatted_string += self.__section_str__(section)
+        lines.extend(self.__section_str__(section) for section in self.sections)
 
-        return formatted_string.strip()
+        return "".join(lines).strip()
 
     def to_file(self, file: str | Path, parents=True, simple=False) -> None:
         """
@@ -264,6 +317,9 @@ class Incar(dict):
         sections = {}
         inline_comments = {}
         solo_comments = []
+        # Section each tag was filed under, so duplicates can be moved
+        # without scanning every section
+        tag_sections = {}
 
         with input_path.open("r") as incar_file:
             incar_text = incar_file.readlines()
@@ -288,15 +344,11 @@ class Incar(dict):
                         comment = line[1:].strip()
                         solo_comments.append((comment, current_section))
                     case _:
-                        key, value = (s.strip() for s in line.split("=", maxsplit=1))
-                        # Test if there is an inline comment and save it
-                        if "!" in value or "#" in value:
-                            comment_start = np.array([value.find("!"), value.find("#")])
-                            comment_start *= -1 if -1 in comment_start else 1
-                            comment_start = np.abs(comment_start.min())
-                            comment = value[comment_start + 1 :].strip()
-                            value = value[:comment_start].strip()
-                            inline_comments[key] = comment
+                        key, value, comment = _INCAR_TAG.match(line).groups()
+                        key, value = key.strip(), value.strip()
+                        # Save the inline comment if there is one
+                        if comment is not None:
+                            inline_comments[key] = comment.strip()
                         try:
                             # If there are spaces, parse it out as a list
                             if " " in value:
@@ -312,9 +364,9 @@ class Incar(dict):
                         # Add the tag to the dictionary
                         if key in tags.keys():
                             print(f'Warning: Key "{key}" appears more than once!')
-                            for k, v in sections.items():
-                                if key in v:
-                                    sections[k].remove(key)
+                            previous_section = tag_sections.pop(key, None)
+                            if previous_section is not None:
+                                sections[previous_section].remove(key)
                         tags[key] = value
                         # Skip the sectioning if this is an orphaned tag
                         if current_section is None:
@@ -324,10 +376,18 @@ class Incar(dict):
                             sections[current_section] = []
                         # Add the tag to the section
                         sections[current_section].append(key)
+                        tag_sections[key] = current_section
 
         return cls(tags, sections, inline_comments, solo_comments)
 
 
+# Species POTCARs are reused heavily when building many POTCARs in one process,
+# so only read each one from disk once
+@lru_cache(maxsize=256)
+def _read_potcar_text(path: str) -> str:
+    return Path(path).read_text()
+
+
 # Class for containing POTCAR info
 # Does not store POTCAR string, but can create it
 class Potcar(object):
@@ -342,15 +402,16 @@ class Potcar(object):
     @classmethod
     def from_poscar(cls, input: str = "POSCAR", directory: str = "."):
         poscar = Poscar.from_file(input)
-        return cls(list(poscar.species.keys()), directory)
+        return cls(list(poscar.species), directory)
 
-    def generate_string(
+    def potential_paths(
         self,
         use_recommended: bool = False,
         use_lda: bool | None = None,
         use_gw: bool = False,
-    ) -> str:
+    ) -> list[Path]:
         """
+        Return the paths to each species' POTCAR, in order.
         If use_recommended is true, the this function will use an internal list of recommended
         pseudopotentials for the matching species.
         These recommendations are split between LDA/PBE and Standard/GW, which are also specified
@@ -397,14 +458,20 @@ class Potcar(object):
                     continue
 
         # Create a list of paths for the species' POTCARs
-        potential_paths = [Path(directory, sp, "POTCAR") for sp in self.potentials]
-
-        # Return the POTCARs as one concatenated string
-        contents = ""
-        for sp in potential_paths:
-            contents += sp.read_text()
+        return [Path(directory, sp, "POTCAR") for sp in self.potentials]
 
-        return contents
+    def generate_string(
+        self,
+        use_recommended: bool = False,
+        use_lda: bool | None = None,
+        use_gw: bool = False,
+    ) -> str:
+        """
+        Return the POTCARs as one concatenated string.
+        See `potential_paths` for how the pseudopotentials are chosen.
+        """
+        potential_paths = self.potential_paths(use_recommended, use_lda, use_gw)
+        return "".join(_read_potcar_text(str(sp.resolve())) for sp in potential_paths)
 
     def generate_file(
         self,
@@ -414,12 +481,23 @@ class Potcar(object):
         use_lda: bool | None = None,
         use_gw: bool = False,
     ) -> None:
-        # Choose the LDA or PBE automatically if it isn't specified
+        """
+        Write the POTCARs to the output file.
+        The species files are copied straight into the output as bytes,
+        without building the concatenated string in memory.
+        """
+        potential_paths = self.potential_paths(use_recommended, use_lda, use_gw)
+        # Check before opening the output so a missing species can't leave a partial file
+        for sp in potential_paths:
+            if not (sp.exists()):
+                raise RuntimeError(f"Could not find POTCAR `{sp}`")
         output_path = Path(output)
         parent = output_path.parent
         Path.mkdir(parent, parents=parents, exist_ok=True)
-        with output_path.open("w") as f:
-            f.write(self.generate_string(use_recommended, use_lda, use_gw))
+        with output_path.open("wb") as f:
+            for sp in potential_paths:
+                with sp.open("rb") as src:
+                    shutil.copyfileobj(src, f)
 
 
 # Class to parse and store POSCAR data in a rich, type hinted, format
@@ -450,6 +528,8 @@ class Poscar(object):
         self.ions = ions
         self.lattice_velocity = lattice_velocity
         self.mdextra = mdextra
+        self._lattice_inv = None
+        self._lattice_inv_key = None
 
     def __str__(self):
         """
@@ -457,6 +537,18 @@ class Poscar(object):
         """
         return self.to_string()
 
+    @property
+    def lattice_inv(self) -> NDArray:
+        """
+        Inverse of the lattice matrix, only recomputed when the lattice changes.
+        """
+        lattice = np.asarray(self.lattice, dtype=float)
+        key = lattice.tobytes()
+        if key != self._lattice_inv_key:
+            self._lattice_inv = _lattice_inverse(lattice)
+            self._lattice_inv_key = key
+        return self._lattice_inv  # type: ignore
+
     def _reconcile_ions(self):
         """
         Count the population of each species of ions and update
@@ -474,12 +566,11 @@ class Poscar(object):
             else:
                 species[isp] = 1
         self.species = species
-        # Make sure the ions are sorted properly
+        # Make sure the ions are sorted properly, reindexing them in their new order
         ions = []
         for sp in self.species.keys():
-            mask = [i.species == sp for _, i in self.ions]
-            ions += list(it.compress(self.ions, mask))
-        self.ions = ions
+            ions += [ion for _, ion in self.ions if ion.species == sp]
+        self.ions = Ions(ions, list(range(len(ions))))
 
     def _toggle_mode(self) -> None:
         """
@@ -506,12 +597,9 @@ class Poscar(object):
             return
 
         # Create the transformation matrix
-        A = self.lattice.transpose()
-        Ainv = np.linalg.inv(A)
+        Ainv = self.lattice_inv.transpose()
         # Convert all ion positions to fractions of the lattice vectors and round to zero
-
-        for i, _ in enumerate(self.ions):
-            self.ions[i]._apply_transformation(Ainv)
+        self._transform_positions(Ainv)
 
         # Change the mode string
         self.mode = "Direct"
@@ -530,12 +618,21 @@ class Poscar(object):
         # Convert all ion positions to fractions of the lattice vectors and round to zero
         # Create the transformation matrix and tolerance
         A = self.lattice.transpose()
-        for i, _ in enumerate(self.ions):
-            self.ions[i]._apply_transformation(A)
+        self._transform_positions(A)
 
         # Change the mode string
         self.mode = "Cartesian"
 
+    def _transform_positions(self, transform: NDArray, tol: float = 1e-8) -> None:
+        """
+        Given transformation matrix (3x3), transform the coordinates of all ions
+        in a single matrix product.
+        """
+        A = transform.reshape(3, 3)
+        r = self.get_positions() @ A.T
+        r[np.abs(r) <= tol] = 0.0
+        self.set_positions(r)
+
     def _constrain(self) -> None:
         """
         Make sure all ions lie within boundary of cell.
@@ -548,8 +645,8 @@ class Poscar(object):
 
         # If any direct mode coordinate exceeds +-1
         # subtract the floor from that coordinate, keeping the fraction
-        for i, ion in self.ions:
-            self.ions[i].position = ion.position - ion.position // 1
+        r = self.get_positions()
+        self.set_positions(r - r // 1)
 
         # Reconvert if necessary
         if converted:
@@ -559,7 +656,7 @@ class Poscar(object):
         """
         Return true if position mode is cartesian.
         """
-        return self.mode[0].lower() in ("c", "k")
+        return _is_cartesian(self.mode)
 
     def is_direct(self) -> bool:
         """
@@ -567,6 +664,45 @@ class Poscar(object):
         """
         return self.mode[0].lower() == "d"
 
+    def get_positions(self) -> NDArray:
+        """
+        Return the positions of all ions as an (N, 3) array in the current mode.
+        """
+        return self.ions.get_positions()
+
+    def get_species(self) -> NDArray:
+        """
+        Return the species of all ions as an (N,) string array.
+        """
+        return np.array([ion.species for _, ion in self.ions], dtype=str)
+
+    def get_direct_positions(self) -> NDArray:
+        """
+        Return the positions of all ions as an (N, 3) array in direct coordinates.
+        """
+        positions = self.get_positions()
+        if self.is_cartesian():
+            positions = positions @ self.lattice_inv
+        return positions
+
+    def _positions_in_mode(self, mode: str, tol: float = 1e-8) -> NDArray:
+        """
+        Return the positions of all ions as an (N, 3) array in the given mode
+        without converting the POSCAR itself.
+        """
+        r = self.get_positions()
+        if _is_cartesian(mode) == self.is_cartesian():
+            return r
+        r = r @ (self.lattice_inv if self.is_cartesian() else self.lattice)
+        r[np.abs(r) <= tol] = 0.0
+        return r
+
+    def set_positions(self, positions: NDArray) -> None:
+        """
+        Overwrite the positions of all ions from an (N, 3) array in the current mode.
+        """
+        self.ions.set_positions(positions)
+
     @classmethod
     def from_file(cls, poscar_file: Path | str):
         """
@@ -589,13 +725,11 @@ class Poscar(object):
                 )
             s_scale = np.array(scale, dtype=float)
 
-            # Read lattice vectors
-            vec = np.array([], dtype=float)
-            for _ in range(3):
-                line = f.readline()
-                v = np.array(line.strip().split(), dtype=float)
-                vec = np.append(vec, v)
-            s_lattice = vec.reshape((3, 3))
+            # Read lattice vectors, parsing all three rows in one call
+            lattice_lines = [f.readline() for _ in range(3)]
+            s_lattice = np.loadtxt(lattice_lines, usecols=(0, 1, 2), ndmin=2)
+            if s_lattice.shape != (3, 3):
+                raise RuntimeError("Malformed lattice vectors in POSCAR!")
 
             # Mandatory check, species names
             # Enforce capitalization
@@ -627,26 +761,36 @@ class Poscar(object):
                 line = f.readline()
 
             # Read ion position mode
-            if line[0].lower() in ("c", "k"):
+            if _is_cartesian(line):
                 s_mode = "Cartesian"
             elif line[0].lower() == "d":
                 s_mode = "Direct"
             else:
                 raise RuntimeError("Unknown position mode")
 
+            # Read the whole ion block and parse the columns in one call each
+            n_ions = sum(s_species.values())
+            ion_lines = [f.readline() for _ in range(n_ions)]
+            positions = np.loadtxt(ion_lines, usecols=(0, 1, 2), ndmin=2)
+            if positions.shape[0] != n_ions:
+                raise RuntimeError("Mismatch between ion counts and ion positions!")
+            if s_selective_dynamics:
+                sd_flags = np.loadtxt(ion_lines, usecols=(3, 4, 5), dtype=str, ndmin=2)
+                # Accept Fortran style logicals (T, t, .TRUE., ...) by their first letter
+                sd_flags = np.char.upper(np.char.lstrip(sd_flags, ".")).astype("<U1")
+                s_sd = sd_flags == "T"
+                valid = s_sd | (sd_flags == "F")
+                if not valid.all():
+                    bad = int(np.argmin(valid.all(axis=1)))
+                    raise RuntimeError(f"Bad selective dynamics entry on ion {bad}!")
+            else:
+                s_sd = np.ones((n_ions, 3), dtype=bool)
+
             # TODO: Strict type hinting HATES this section
             # Read in ion
             s_ions = Ions([], [])
             ions = it.chain.from_iterable([[sp] * c for sp, c in s_species.items()])
-            for i, sp in enumerate(ions):
-                line = f.readline().split()
-                r = np.array(line[0:3], dtype=float)
-                sd = ("True",) * 3
-                if s_selective_dynamics:
-                    sd = np.array(
-                        tuple([False if f == "F" else True for f in line[3:6]]),
-                        dtype=bool,
-                    )
+            for i, (sp, r, sd) in enumerate(zip(ions, positions, s_sd)):
                 v = np.zeros(3)
                 s_ions.append(Ion(r, sp, sd, v), i)  # type: ignore
 
@@ -667,54 +811,60 @@ class Poscar(object):
         """
         Return a formatted string of the POSCAR dictionary as would be found in a file.
         """
+        buffer = io.StringIO()
+        self._write_stream(buffer)
+        return buffer.getvalue()
+
+    def _write_stream(self, stream: TextIO) -> None:
+        """
+        Write the POSCAR, as would be found in a file, section by section to a text stream.
+        """
         # Write comment line
-        poscar_string = ""
-        poscar_string += self.comment + "\n"
+        stream.write(self.comment + "\n")
 
         # Write scaling factor
         if np.allclose(self.scale, [self.scale[0]] * 3):
-            poscar_string += "  {:>11.8f}\n".format(self.scale[0])
+            stream.write("  {:>11.8f}\n".format(self.scale[0]))
         else:
-            poscar_string += "  {:>11.8f}  {:>11.8f}  {:>11.8f}\n".format(*self.scale)
+            stream.write("  {:>11.8f}  {:>11.8f}  {:>11.8f}\n".format(*self.scale))
 
         # Write lattice vectors
-        for i in self.lattice:
-            poscar_string += "    {:>11.8f}  {:>11.8f}  {:>11.8f}\n".format(*i)
+        stream.writelines(
+            "    {:>11.8f}  {:>11.8f}  {:>11.8f}\n".format(*i) for i in self.lattice
+        )
 
         # Write the species names
-        line = ""
         # If all the species are placeholder H0, H1, H2, ..., then skip writing this line
         if False in [bool(re.match(r"H[0-9]+", sp)) for sp in self.species.keys()]:
-            line += " ".join([f"{sp:>6s}" for sp in self.species.keys()]) + "\n"
-        else:
-            line = ""
-        poscar_string += line
+            stream.write(" ".join([f"{sp:>6s}" for sp in self.species.keys()]) + "\n")
 
         # Write species numbers
-        line = ""
-        line += " ".join([f"{c:>6d}" for c in self.species.values()]) + "\n"
-        poscar_string += line
+        stream.write(" ".join([f"{c:>6d}" for c in self.species.values()]) + "\n")
 
         # Write selective dynamics if enabled
         if self.selective_dynamics:
-            poscar_string += "Selective dynamics\n"
+            stream.write("Selective dynamics\n")
 
         # Write position mode
-        poscar_string += self.mode + "\n"
+        stream.write(self.mode + "\n")
 
-        # Write the ion positions with selective dynamics tags if needed
-        for _, ion in self.ions:
-            line = "{:>11.8f}  {:>11.8f}  {:>11.8f}".format(*ion.position)
-            if self.selective_dynamics:
-                line += " {:>1s} {:>1s} {:>1s}".format(
-                    *["T" if t else "F" for t in ion.selective_dynamics]
-                )
-            poscar_string += line + "\n"
+        # Write the ion positions with selective dynamics tags if needed.
+        # Gather everything into arrays first and format plain Python values,
+        # which is much faster than formatting NumPy scalars one at a time.
+        positions = self.get_positions().tolist()
+        if self.selective_dynamics:
+            flags = np.array(
+                [ion.selective_dynamics for _, ion in self.ions], dtype=bool
+            ).reshape((-1, 3))
+            flags = np.where(flags, "T", "F").tolist()
+            stream.writelines(
+                _ION_SD_LINE.format(*r, *sd) for r, sd in zip(positions, flags)
+            )
+        else:
+            stream.writelines(_ION_LINE.format(*r) for r in positions)
 
         # TODO: Write littec vector and ion velocities and MD extra
 
-        return poscar_string
-
     def to_file(self, file: str | Path, parents=True) -> None:
         """
         Write the POSCAR to the given file.
@@ -723,14 +873,14 @@ class Poscar(object):
         parent = file.parent
         Path.mkdir(parent, parents=parents, exist_ok=True)
         with file.open("w") as f:
-            f.write(self.to_string())
+            self._write_stream(f)
 
     def generate_potcar_str(self, potcar_dir: str = ".") -> str:
         """
         Generate a POTCAR for the current POSCAR.
         """
         # Define pseudopotential path
-        potcar = Potcar(list(self.species.keys()), potcar_dir)
+        potcar = Potcar(list(self.species), potcar_dir)
         return potcar.generate_string()
 
     def generate_potcar_file(
@@ -739,7 +889,7 @@ class Poscar(object):
         """
         Generate and write a POTCAR for the current POSCAR.
         """
-        potcar = Potcar(list(self.species.keys()), potcar_dir)
+        potcar = Potcar(list(self.species), potcar_dir)
         potcar.generate_file(output)
 
     def edit_ions(self, ions: Ions):
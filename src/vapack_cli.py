@@ -4,15 +4,16 @@
 Command line program that provides easy access to tools in Vasp Tool Kit
 """
 
-from copy import deepcopy
+from __future__ import annotations
+
+from copy import copy
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 import click
-import numpy as np
-import numpy.typing as npt
 
-import vapack.extensions as vext
-from vapack.types import Incar, Ion, Ions, Poscar, Potcar
+if TYPE_CHECKING:
+    import numpy.typing as npt
 
 # Notes to whoever attempts to maintain this:
 #
@@ -24,6 +25,9 @@ from vapack.types import Incar, Ion, Ions, Poscar, Potcar
 # 2. This is now constructed using Click, which does what
 #    I had previously implemented, but better. See:
 #    https://palletsprojects.com/projects/click/
+#
+# 3. NumPy and the vapack modules are imported inside each command so
+#    that `vapack --help` and argument errors return without loading them.
 
 
 @click.group()
@@ -49,6 +53,8 @@ def convert(
     verbose: bool = False,
     write: bool = True,
 ) -> None:
+    from vapack.types import Poscar
+
     # Determine output location
     input_path = Path(input)
     output_path = (
@@ -64,15 +70,17 @@ def convert(
     # Read in file
     poscar = Poscar.from_file(input_path)
 
-    # If toggle mode, choose the correct
-    if mode is None:
-        poscar._toggle_mode()
-    elif mode.lower().startswith("c"):
-        poscar._convert_to_cartesian()
-    elif mode.lower().startswith("d"):
-        poscar._convert_to_direct()
-    else:
+    # Pick the conversion from the first letter of the mode, or toggle if unset
+    conversions = {
+        None: Poscar._toggle_mode,
+        "c": Poscar._convert_to_cartesian,
+        "d": Poscar._convert_to_direct,
+    }
+    try:
+        conversion = conversions[None if mode is None else mode[0].lower()]
+    except KeyError:
         raise RuntimeError("Unknown conversion")
+    conversion(poscar)
 
     # Write the new POSCAR
     if write:
@@ -103,6 +111,10 @@ def vacuum(
     verbose: bool = False,
     write: bool = False,
 ) -> None:
+    import numpy as np
+
+    from vapack.types import Poscar
+
     # Determine output location
     input_path = Path(input)
     output_path = (
@@ -118,18 +130,19 @@ def vacuum(
     # Read in the file
     poscar = Poscar.from_file(input_path)
 
-    # Convert the POSCAR to cartesian
-    poscar._convert_to_cartesian()
-
-    # TODO: Interpret the depth, which may be 3 independent values
+    # Extend each lattice vector along its own direction by the given depth.
+    # The scaling factors apply per cartesian axis, so measure the lengths in Å
+    # after scaling. Stretching a vector scales its scaled form by the same ratio.
+    depth = np.asarray(depth, dtype=float)
+    lengths = np.linalg.norm(poscar.lattice * poscar.scale, axis=1)
+    if (lengths + depth <= 0).any():
+        raise RuntimeError(f"Vacuum depth {depth} collapses the lattice!")
+    poscar.lattice += (depth / lengths)[:, None] * poscar.lattice
 
-    # TODO: Take into account non-unity scaling factors
-
-    # Add the vacuum layer in only the c-direction (roughly)
-    # Take the 3 valued depth, cast to 3x3 diagonal matrix, and add to lattice
-    if type(depth) is not np.array:
-        depth = np.array(depth)
-    poscar.lattice += np.diag(depth)
+    # Ions keep their cartesian positions, so direct coordinates shrink by the
+    # same ratio the lattice vectors grew. No mode round trip is needed.
+    if poscar.is_direct():
+        poscar.set_positions(poscar.get_positions() * lengths / (lengths + depth))
 
     # Write the new POSCAR
     if write:
@@ -178,6 +191,8 @@ def potcar(
     verbose: bool = False,
     write: bool = False,
 ):
+    from vapack.types import Poscar, Potcar
+
     # Cast input, output, and directory to paths
     input_path = Path(input)
     output_path = Path(output)
@@ -192,12 +207,12 @@ def potcar(
             raise RuntimeError(
                 'Since POSCAR is "none", a potentials list must be provided!'
             )
-        species = potentials
+        species = list(potentials)
 
     # If the POSCAR is a file (not 'none')
     else:
         poscar = Poscar.from_file(input_path)
-        species = list(poscar.species.keys())
+        species = list(poscar.species)
 
     # Create the potcar object
     potcar = Potcar(species, directory_path)
@@ -299,6 +314,11 @@ def slabfreeze(
     verbose: bool = False,
     write: bool = True,
 ):
+    import numpy as np
+
+    import vapack.extensions as vext
+    from vapack.types import Ion, Poscar
+
     # Read the input file
     input_path = Path(input)
     poscar = Poscar.from_file(input)
@@ -331,15 +351,17 @@ def slabfreeze(
     # Get box selection of ions
     selection = vext.get_select_box(poscar, x_range, y_range, z_range, mode)
 
-    # Change the selective dynamics of selection
-    for i, _ in enumerate(poscar.ions):
-        d = dynamics
-        if i not in selection.indices:
-            if preserve:
-                continue
-            # poscar.ions[i].selective_dynamics = np.array([True]*3, dtype=bool)
-            d = Ion.list_to_bools(("T", "T", "T"))
-        poscar.ions[i].selective_dynamics = d
+    # Mark the selected ions once instead of searching the index list per ion
+    selected = np.zeros(len(poscar.ions), dtype=bool)
+    selected[selection.indices] = True
+    free = Ion.list_to_bools(("T", "T", "T"))
+
+    # Change the selective dynamics of selection, giving each ion its own flags
+    for (_, ion), in_box in zip(poscar.ions, selected):
+        if in_box:
+            ion.selective_dynamics = dynamics.copy()
+        elif not preserve:
+            ion.selective_dynamics = free.copy()
     poscar.selective_dynamics = True
 
     # Final verbose message
@@ -391,6 +413,10 @@ def interpolate(
     verbose: bool = False,
     write: bool = False,
 ):
+    import numpy as np
+
+    from vapack.types import Ion, Ions, Poscar
+
     # Load the anchors
     poscar1 = Poscar.from_file(file1)
     poscar2 = Poscar.from_file(file2)
@@ -405,78 +431,72 @@ def interpolate(
         raise RuntimeError("Number of ions do not match!")
 
     # Ensure no ions cross the unit cell boundaries
-    boundary_resolution_indices = []
-    # TODO: Pyright is being tricked into thinking this is an iterator for an Ion,
-    # not an iterator for an Ions. Figure out why.
-    for (i, ion1), (_, ion2) in zip(poscar1.ions, poscar2.ions):  # type: ignore
-        if (np.sign(ion1.position) * np.sign(ion2.position)).sum() != 3:
-            print(f"Warning: Ion {i} crossed boundary between anchors!")
-            boundary_resolution_indices += [i]
+    positions1 = poscar1.get_positions()
+    positions2 = poscar2.get_positions()
+    crossed = (np.sign(positions1) * np.sign(positions2)).sum(axis=1) != 3
+    boundary_resolution_indices = np.flatnonzero(crossed).tolist()
+    for i in boundary_resolution_indices:
+        print(f"Warning: Ion {i} crossed boundary between anchors!")
 
-    # Template the output poscar image
-    image_template = deepcopy(poscar1)
+    # Template the output poscar image. The ions are replaced for every image,
+    # so a shallow copy of the header data is enough.
+    image_template = copy(poscar1)
 
     # Disable selective dynamics unless told not to change it
     if not (selective_dynamics):
         image_template.selective_dynamics = False
 
-    # Interpolate between ion positions and save to template
-    boundary_resolver_message_printed = False
-    dynamics_resolver_message_printed = False
-    for i in range(images + 2):
-        # Erase the existing ion data in the template
-        image_template.ions = Ions([], [])
-        # Get interpolated ion positions
-        for (j, ion1), (_, ion2) in zip(poscar1.ions, poscar2.ions):  # type: ignore
-            new_ion = Ion()
-            new_ion.species = ion1.species
-            # Handle edge cases where there'll be bad interpolation
-            if j in boundary_resolution_indices:
-                if not (boundary_resolver_message_printed):
-                    boundary_resolver_message_printed = True
-                    print(f'Resolving case on ion {j} with "{boundary_resolver}"')
-                if boundary_resolver == "first":
-                    if i < images + 1:
-                        new_ion.position = ion1.position
-                    else:
-                        new_ion.position = ion2.position
-                elif boundary_resolver == "last":
-                    if i == 0:
-                        new_ion.position = ion1.position
-                    else:
-                        new_ion.position = ion2.position
-            # For normal cases, go by normal linear interpolation
-            else:
-                new_ion.position = (
-                    ion1.position + (ion2.position - ion1.position) / (images + 1) * i
-                )
-            # Add selective dynamics tags if appropriate
-            if selective_dynamics:
-                if not (
-                    np.array_equal(ion1.selective_dynamics, ion2.selective_dynamics)
-                ):
-                    dynamics_resolver = (
-                        "free" if dynamics_resolver is None else dynamics_resolver
-                    )
-                    if not (dynamics_resolver_message_printed):
-                        dynamics_resolver_message_printed = True
-                        print(
-                            f"Ion {j} selective dynamics disagreed. Resolving with {dynamics_resolver}."
-                        )
-                    if dynamics_resolver == "first":
-                        new_ion.selective_dynamics = ion1.selective_dynamics
-                    elif dynamics_resolver == "last":
-                        new_ion.selective_dynamics = ion2.selective_dynamics
-                    elif dynamics_resolver == "free":
-                        new_ion.selective_dynamics = np.array([True] * 3)
-                    elif dynamics_resolver == "fixed":
-                        new_ion.selective_dynamics = np.array([False] * 3)
-                    else:
-                        # New ion object default (currently all true)
-                        pass
-                else:
-                    new_ion.selective_dynamics = ion1.selective_dynamics
-            image_template.ions.append(new_ion, j)
+    # Selective dynamics tags are the same for every image, so resolve them once.
+    # Ions default to all true when the tags aren't carried over.
+    flags1 = np.array([ion.selective_dynamics for _, ion in poscar1.ions], dtype=bool)
+    flags2 = np.array([ion.selective_dynamics for _, ion in poscar2.ions], dtype=bool)
+    flags1, flags2 = flags1.reshape((-1, 3)), flags2.reshape((-1, 3))
+    flags = np.ones((len(poscar1.ions), 3), dtype=bool)
+    if selective_dynamics:
+        flags = flags1.copy()
+        disagreed = np.flatnonzero((flags1 != flags2).any(axis=1)).tolist()
+        if disagreed:
+            dynamics_resolver = (
+                "free" if dynamics_resolver is None else dynamics_resolver
+            )
+            print(
+                f"Ion {disagreed[0]} selective dynamics disagreed. "
+                f"Resolving with {dynamics_resolver}."
+            )
+            if dynamics_resolver == "last":
+                flags[disagreed] = flags2[disagreed]
+            elif dynamics_resolver == "fixed":
+                flags[disagreed] = False
+            elif dynamics_resolver != "first":
+                flags[disagreed] = True
+
+    # Interpolate every image at once as an (images + 2, N, 3) array
+    steps = np.arange(images + 2)[:, None, None]
+    frames = positions1 + (positions2 - positions1) / (images + 1) * steps
+    # Handle edge cases where there'll be bad interpolation
+    if boundary_resolution_indices:
+        print(
+            f"Resolving case on ion {boundary_resolution_indices[0]} "
+            f'with "{boundary_resolver}"'
+        )
+        if boundary_resolver == "first":
+            frames[: images + 1, crossed] = positions1[crossed]
+            frames[images + 1 :, crossed] = positions2[crossed]
+        elif boundary_resolver == "last":
+            frames[:1, crossed] = positions1[crossed]
+            frames[1:, crossed] = positions2[crossed]
+        else:
+            # New ion object default (the origin)
+            frames[:, crossed] = 0.0
+
+    # Save each image through the template
+    species = [ion.species for _, ion in poscar1.ions]
+    for i, positions in enumerate(frames):
+        # Replace the ion data in the template
+        image_template.ions = Ions(
+            [Ion(r, sp, sd) for r, sp, sd in zip(positions, species, flags)],
+            list(poscar1.ions.indices),
+        )
         # Create output path
         output_path = Path(".", str(i).zfill(2), "POSCAR")
         # Write the file
@@ -512,6 +532,8 @@ def genincar(
     verbose: bool = False,
     write: bool = False,
 ):
+    from vapack.types import Incar
+
     # Set the template containing directory
     if not isinstance(template_dir, Path):
         template_dir = Path(template_dir)